@@ -0,0 +1,68 @@
+import argparse
+import random
+import time
+from track import Track
+from simulation import Simulation
+
+# ============================================================
+#   Action-Repeat Report
+# ============================================================
+# Trains the same seeded population on a saved track once per action-repeat
+# setting (no window) and prints how tick cost and lap times compare.
+#
+#   python action_repeat_report.py tracks/track_001.json --repeats 1 2 4 8
+
+SIZE = (1600, 900)  # window size the tracks were drawn at
+
+
+def run(points, action_repeat, generations, population_size, generation_time, seed):
+    """Train for a number of generations; return (ms per tick, fastest lap per generation)."""
+    random.seed(seed)
+    simulation = Simulation(SIZE, population_size, generation_time, action_repeat=action_repeat)
+    simulation.set_track(points)
+
+    laps = []
+    ticks = 0
+    start = time.perf_counter()
+    while simulation.population.generation < generations:
+        generation = simulation.population.generation
+        simulation.tick()
+        ticks += 1
+        if simulation.population.generation != generation:
+            laps.append(simulation.prev_gen_best)
+    ms_per_tick = (time.perf_counter() - start) * 1000 / ticks
+    return ms_per_tick, laps
+
+
+def format_lap(lap):
+    """Lap time in seconds, or '---' if no car finished."""
+    return f"{lap:.2f}" if lap is not None else "---"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare lap times and tick cost across action-repeat settings.")
+    parser.add_argument("track", help="saved track JSON (see the Save Track button)")
+    parser.add_argument("--repeats", type=int, nargs="+", default=[1, 2, 4, 8], help="action-repeat values to try")
+    parser.add_argument("--generations", type=int, default=10)
+    parser.add_argument("--population", type=int, default=40)
+    parser.add_argument("--generation-time", type=float, default=30, help="simulated seconds per generation")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    points = Track.load_points(args.track)
+    baseline = None
+
+    print(f"{'K':>3} {'ms/tick':>8} {'speedup':>8} {'finished':>9} {'best lap':>9} {'last lap':>9}  laps per generation")
+    for action_repeat in args.repeats:
+        ms_per_tick, laps = run(points, action_repeat, args.generations, args.population, args.generation_time, args.seed)
+        baseline = baseline if baseline else ms_per_tick
+
+        finished = [lap for lap in laps if lap is not None]
+        best = min(finished) if finished else None
+        print(f"{action_repeat:>3} {ms_per_tick:>8.2f} {baseline / ms_per_tick:>7.2f}x "
+              f"{len(finished):>4}/{len(laps):<4} {format_lap(best):>9} {format_lap(laps[-1] if laps else None):>9}  "
+              + " ".join(format_lap(lap) for lap in laps))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,194 +1,193 @@
 import pygame
+import glob
+import os
+import re
 from track import Track
-from car import Car, CarState
-from environment import Population
+from simulation import SimulationProcess, Command
 import colorsys
 
 # ============================================================
-#   Pygame and Window Setup
+#   Window and Simulation Settings
 # ============================================================
-pygame.init()
 WIDTH, HEIGHT = 1600, 900
-WINDOW = pygame.display.set_mode((WIDTH, HEIGHT))
-pygame.display.set_caption("AI Racing Simulator")
-FONT = pygame.font.SysFont("Arial", 20)
 
-def draw_text(surface, text, pos, color=(255, 255, 255)):
+POPULATION_SIZE = 40
+GENERATION_TIME = 30       # seconds of simulated time per generation
+
+TRACKS_DIR = "tracks"              # saved tracks used for multi-track evaluation
+MULTI_TRACK_AGGREGATE = "mean"     # "mean" or "worst" score across tracks
+ACTION_REPEAT = 1                  # ticks between decisions (see action_repeat_report.py)
+
+UI_X = WIDTH - 300
+
+# Button rectangles
+BUTTON_WIDTH, BUTTON_HEIGHT = 100, 30
+BTN_PADDING = 10
+
+def draw_text(surface, font, text, pos, color=(255, 255, 255)):
     """Helper to render text onto the Pygame window."""
-    label = FONT.render(text, True, color)
+    label = font.render(text, True, color)
     surface.blit(label, pos)
 
+def save_track(track):
+    """Save the current track into the tracks folder under the next free number."""
+    os.makedirs(TRACKS_DIR, exist_ok=True)
+    indices = []
+    for path in glob.glob(os.path.join(TRACKS_DIR, "track_*.json")):
+        match = re.match(r"track_(\d+)\.json$", os.path.basename(path))
+        if match:
+            indices.append(int(match.group(1)))
+    index = max(indices, default=0) + 1  # never reuse a number, even if older tracks were deleted
+    track.save(os.path.join(TRACKS_DIR, f"track_{index:03d}.json"))
+
+def load_saved_tracks():
+    """Load the points of every saved track."""
+    return [Track.load_points(path) for path in sorted(glob.glob(os.path.join(TRACKS_DIR, "track_*.json")))]
+
+
+def main():
+    # ============================================================
+    #   Pygame and Window Setup
+    # ============================================================
+    pygame.init()
+    window = pygame.display.set_mode((WIDTH, HEIGHT))
+    pygame.display.set_caption("AI Racing Simulator")
+    font = pygame.font.SysFont("Arial", 20)
+
+    # ============================================================
+    #   Simulation Variables
+    # ============================================================
+    running = True
+    drawing = False
+    track = Track(window)
+
+    # Simulation runs in its own process and sends snapshots for rendering
+    simulation = SimulationProcess((WIDTH, HEIGHT), POPULATION_SIZE, GENERATION_TIME, MULTI_TRACK_AGGREGATE, ACTION_REPEAT)
+    simulation.start()
+
+    clock = pygame.time.Clock()
+
+    # ============================================================
+    #   UI State Variables
+    # ============================================================
+    show_history = True
+    show_sensors = False
+    multi_track = False
+
+    # Button positions
+    btn_history_rect = pygame.Rect(BTN_PADDING, BTN_PADDING, BUTTON_WIDTH, BUTTON_HEIGHT)
+    btn_sensors_rect = pygame.Rect(BTN_PADDING, BTN_PADDING*2 + BUTTON_HEIGHT, BUTTON_WIDTH, BUTTON_HEIGHT)
+    btn_save_rect = pygame.Rect(BTN_PADDING, BTN_PADDING*3 + BUTTON_HEIGHT*2, BUTTON_WIDTH, BUTTON_HEIGHT)
+    btn_multi_rect = pygame.Rect(BTN_PADDING, BTN_PADDING*4 + BUTTON_HEIGHT*3, BUTTON_WIDTH, BUTTON_HEIGHT)
+
+    # ============================================================
+    #   Main Loop
+    # ============================================================
+    while running:
+        # --- Timing (render rate only; the simulation runs at its own pace) ---
+        clock.tick(60)
+        simulation.check()
+
+        # ========================================================
+        #   Event Handling
+        # ========================================================
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                running = False
+
+            elif event.type == pygame.MOUSEBUTTONDOWN:
+                if btn_history_rect.collidepoint(event.pos):
+                    show_history = not show_history
+                    simulation.send(Command.SET_HISTORY, show_history)
+                elif btn_sensors_rect.collidepoint(event.pos):
+                    show_sensors = not show_sensors
+                    simulation.send(Command.SET_SENSORS, show_sensors)
+                elif btn_save_rect.collidepoint(event.pos):
+                    if track.points:
+                        save_track(track)
+                elif btn_multi_rect.collidepoint(event.pos):
+                    multi_track = not multi_track
+                    simulation.send(Command.SET_EXTRA_TRACKS, load_saved_tracks() if multi_track else [])
+                else:
+                    # Start drawing a new track
+                    drawing = True
+                    track.clear()
+                    track.add_point(event.pos)
+                    simulation.send(Command.CLEAR_TRACK)  # reset AI
+
+            elif event.type == pygame.MOUSEBUTTONUP and drawing:
+                drawing = False
+                track.smooth()
+                track.draw()
+                if len(track.points) >= 2:
+                    simulation.send(Command.SET_TRACK, list(track.points))
+
+            elif event.type == pygame.MOUSEMOTION and drawing:
+                track.add_point(event.pos)
 
-# ============================================================
-#   Simulation Variables
-# ============================================================
-running = True
-drawing = False
-track = Track(WINDOW)
+        # Draw current track
+        track.draw()
 
-POPULATION_SIZE = 40
-GENERATION_TIME = 30       # seconds per generation
+        # ========================================================
+        #   Rendering (latest published snapshot)
+        # ========================================================
+        snapshot = simulation.latest()
+        if snapshot.active:
+            # Draw remaining cars (leader first, with its history and sensors)
+            snapshot.draw(window)
 
-population = None
-population_count = 1
-generation_timer = GENERATION_TIME
+            # --- UI Stats ---
+            draw_text(window, font, f"Time ({int((snapshot.elapsed / GENERATION_TIME) * 100)}%): {int(snapshot.elapsed)}s / {int(GENERATION_TIME)}s", (UI_X, 10))
+            draw_text(window, font, f"Generation: {snapshot.generation}", (UI_X, 35))
+            draw_text(window, font, f"Tracks: {snapshot.track_count}" + (f" ({MULTI_TRACK_AGGREGATE})" if snapshot.track_count > 1 else ""), (UI_X, 60))
 
-clock = pygame.time.Clock()
-UI_X = WIDTH - 300
+            # Fastest Time Display
+            draw_text(window, font, f"All-Time Fastest: {snapshot.all_time_best if snapshot.all_time_best is not None else '---'}s", (UI_X, 85))
+            draw_text(window, font, f"Previous Fastest: {snapshot.prev_gen_best if snapshot.prev_gen_best is not None else '---'}s", (UI_X, 135))
+            draw_text(window, font, f"Current Fastest: {snapshot.current_gen_best if snapshot.current_gen_best != -1 else '---'}s", (UI_X, 160))
 
-# ============================================================
-#   UI State Variables
-# ============================================================
-show_history = True
-show_sensors = False
+            # --- Buttons ---
+            pygame.draw.rect(window, (100, 100, 100), btn_history_rect)
+            pygame.draw.rect(window, (100, 100, 100), btn_sensors_rect)
+            pygame.draw.rect(window, (100, 100, 100), btn_save_rect)
+            pygame.draw.rect(window, (100, 100, 100), btn_multi_rect)
 
-# Button rectangles
-BUTTON_WIDTH, BUTTON_HEIGHT = 100, 30
-BTN_PADDING = 10
+            draw_text(window, font, f"History: {'On' if show_history else 'Off'}", (btn_history_rect.x + 5, btn_history_rect.y + 5))
+            draw_text(window, font, f"Sensors: {'On' if show_sensors else 'Off'}", (btn_sensors_rect.x + 5, btn_sensors_rect.y + 5))
+            draw_text(window, font, "Save Track", (btn_save_rect.x + 5, btn_save_rect.y + 5))
+            draw_text(window, font, f"Multi: {'On' if multi_track else 'Off'}", (btn_multi_rect.x + 5, btn_multi_rect.y + 5))
 
-# Positions
-btn_history_rect = pygame.Rect(BTN_PADDING, BTN_PADDING, BUTTON_WIDTH, BUTTON_HEIGHT)
-btn_sensors_rect = pygame.Rect(BTN_PADDING, BTN_PADDING*2 + BUTTON_HEIGHT, BUTTON_WIDTH, BUTTON_HEIGHT)
 
-# ============================================================
-#   Fastest Time Tracking Variables
-# ============================================================
-all_time_best = None          # Best time across all generations
-prev_gen_best = None          # Best time in previous generation
-current_gen_best = -1         # Best time in current generation (-1 = none yet)
+            # --- Top 20% Offspring Visualization ---
+            if snapshot.pcts:
+                bar_width = WIDTH - 40  # leave 20px padding on each side
+                bar_height = 20
+                x_start = 20
+                y_start = HEIGHT - bar_height - 20
 
+                # Draw background bar
+                pygame.draw.rect(window, (50, 50, 50), (x_start, y_start, bar_width, bar_height))
 
-# ============================================================
-#   Main Loop
-# ============================================================
-while running:
-    # --- Timing ---
-    dt = clock.tick(60) / 1000
-    generation_timer -= dt
-    
-    # ========================================================
-    #   Event Handling
-    # ========================================================
-    for event in pygame.event.get():
-        if event.type == pygame.QUIT:
-            running = False
-
-        elif event.type == pygame.MOUSEBUTTONDOWN:
-            if btn_history_rect.collidepoint(event.pos):
-                show_history = not show_history
-            elif btn_sensors_rect.collidepoint(event.pos):
-                show_sensors = not show_sensors
-            else:
-                # Start drawing a new track
-                drawing = True
-                track.clear()
-                track.add_point(event.pos)
-                population = None  # reset AI
-
-        elif event.type == pygame.MOUSEBUTTONUP and drawing:
-            drawing = False
-            track.smooth()
-            track.draw()
-            if track.points:
-                population = Population(track, POPULATION_SIZE)
-                generation_timer = GENERATION_TIME
-                population_count = 1
-                current_gen_best = -1
-                prev_gen_best = None
-                all_time_best = None
-
-        elif event.type == pygame.MOUSEMOTION and drawing:
-            track.add_point(event.pos)
-
-    # Draw current track
-    track.draw()
-
-    # ========================================================
-    #   Simulation Update
-    # ========================================================
-    if population:
-        all_crashed = True
-        for car in population.cars:
-            car.think()
-            car.update()
-            if car.state != CarState.CRASHED:
-                all_crashed = False
-
-            # --- Update current generation fastest time ---
-            if car.state == CarState.GOAL:
-                car_time = GENERATION_TIME - generation_timer
-                car_time = round(car_time, 2)  # hundredths of a second
-                if current_gen_best == -1 or car_time < current_gen_best:
-                    current_gen_best = car_time
-
-        # --- Reset generation if time is up or all cars crashed ---
-        if generation_timer <= 0 or all_crashed:
-            population.evaluate_fitness()
-            prev_best_score = max(car.score for car in population.cars)
-            population.select_and_breed()
-            generation_timer = GENERATION_TIME
-            population_count += 1
-
-            # --- Update fastest times ---
-            prev_gen_best = current_gen_best if current_gen_best != -1 else None
-            current_gen_best = -1
-            if prev_gen_best is not None:
-                if all_time_best is None or prev_gen_best < all_time_best:
-                    all_time_best = prev_gen_best
-
-    # ========================================================
-    #   Rendering
-    # ========================================================
-    if population:
-        # Sort cars by descending fitness
-        population.cars.sort(key=lambda c: c.score, reverse=True)
-
-        # Draw remaining cars
-        for i, car in enumerate(population.cars):
-            car.draw(history=(i < 1 and show_history), sensors=(i < 1 and show_sensors))
-
-        # --- UI Stats ---
-        draw_text(WINDOW, f"Time ({int((1 - (generation_timer / GENERATION_TIME)) * 100)}%): {int(GENERATION_TIME - generation_timer)}s / {int(GENERATION_TIME)}s", (UI_X, 10))
-        draw_text(WINDOW, f"Generation: {population_count}", (UI_X, 35))
-
-        # Fastest Time Display
-        draw_text(WINDOW, f"All-Time Fastest: {all_time_best if all_time_best is not None else '---'}s", (UI_X, 85))
-        draw_text(WINDOW, f"Previous Fastest: {prev_gen_best if prev_gen_best is not None else '---'}s", (UI_X, 135))
-        draw_text(WINDOW, f"Current Fastest: {current_gen_best if current_gen_best != -1 else '---'}s", (UI_X, 160))
-        
-        # --- Buttons ---
-        pygame.draw.rect(WINDOW, (100, 100, 100), btn_history_rect)
-        pygame.draw.rect(WINDOW, (100, 100, 100), btn_sensors_rect)
-
-        draw_text(WINDOW, f"History: {'On' if show_history else 'Off'}", (btn_history_rect.x + 5, btn_history_rect.y + 5))
-        draw_text(WINDOW, f"Sensors: {'On' if show_sensors else 'Off'}", (btn_sensors_rect.x + 5, btn_sensors_rect.y + 5))
-
-
-        # --- Top 20% Offspring Visualization ---
-        if population.pcts:
-            bar_width = WIDTH - 40  # leave 20px padding on each side
-            bar_height = 20
-            x_start = 20
-            y_start = HEIGHT - bar_height - 20
-
-            # Draw background bar
-            pygame.draw.rect(WINDOW, (50, 50, 50), (x_start, y_start, bar_width, bar_height))
-
-            # Draw each car's offspring block
-            accumulated_width = 0
-            n_cars = len(population.pcts)
-            for i, pct in enumerate(population.pcts):
-                block_width = int(bar_width * (pct / 100))
-
-                # --- Dynamic color based on position in list ---
-                hue = i / n_cars          # evenly spread hue from 0.0 → 1.0
-                rgb_float = colorsys.hsv_to_rgb(hue, 0.8, 0.9)  # saturation=0.8, value=0.9
-                color = tuple(int(c * 255) for c in rgb_float)
-
-                pygame.draw.rect(WINDOW, color, (x_start + accumulated_width, y_start, block_width, bar_height))
-                accumulated_width += block_width
-
-
-    pygame.display.flip()
-
-pygame.quit()
+                # Draw each car's offspring block
+                accumulated_width = 0
+                n_cars = len(snapshot.pcts)
+                for i, pct in enumerate(snapshot.pcts):
+                    block_width = int(bar_width * (pct / 100))
+
+                    # --- Dynamic color based on position in list ---
+                    hue = i / n_cars          # evenly spread hue from 0.0 → 1.0
+                    rgb_float = colorsys.hsv_to_rgb(hue, 0.8, 0.9)  # saturation=0.8, value=0.9
+                    color = tuple(int(c * 255) for c in rgb_float)
+
+                    pygame.draw.rect(window, color, (x_start + accumulated_width, y_start, block_width, bar_height))
+                    accumulated_width += block_width
+
+
+        pygame.display.flip()
+
+    simulation.stop()
+    pygame.quit()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,5 @@
 import pygame
+from array import array
 from enum import Enum
 import math
 from track import Track
@@ -20,17 +21,13 @@ class CarState(Enum):
 class CarHistoryNode:
     NODE_SIZE = 3
 
-    def __init__(self, surface, position: pygame.Vector2, acceleration: float):
-        self.surface = surface
-        self.position = position.copy()
-        self.acceleration = acceleration
-
-    def draw(self):
+    @staticmethod
+    def draw(surface, x, y, acceleration):
         """Draw history node with color indicating acceleration (red = brake, green = accel)."""
         # Normalize acceleration into [-1, 1]
-        norm = max(-1, min(1, self.acceleration / Car.ACCELERATION_RATE))
+        norm = max(-1, min(1, acceleration / Car.ACCELERATION_RATE))
 
-        if self.acceleration < 0:
+        if acceleration < 0:
             # From red to yellow
             r, g, b = 255, int(255 * (1 + norm)), 0
         else:
@@ -41,15 +38,23 @@ class CarHistoryNode:
         color = (r, g, b, alpha)
 
         # Temporary surface with alpha blending
-        node_surf = pygame.Surface((self.NODE_SIZE * 2, self.NODE_SIZE * 2), pygame.SRCALPHA)
-        pygame.draw.circle(node_surf, color, (self.NODE_SIZE, self.NODE_SIZE), self.NODE_SIZE)
-        self.surface.blit(node_surf, self.position - pygame.Vector2(self.NODE_SIZE, self.NODE_SIZE))
+        size = CarHistoryNode.NODE_SIZE
+        node_surf = pygame.Surface((size * 2, size * 2), pygame.SRCALPHA)
+        pygame.draw.circle(node_surf, color, (size, size), size)
+        surface.blit(node_surf, (x - size, y - size))
 
 
 # ============================================================
 #   Car Class
 # ============================================================
 class Car:
+    __slots__ = (
+        "track", "brain", "start_position", "start_angle",
+        "position", "velocity", "acceleration", "angle",
+        "state", "keep_history", "history", "history_count", "score", "progress",
+        "action_repeat", "phase", "ticks", "output", "reward",
+    )
+
     # --- Movement constants ---
     ACCELERATION_RATE = 0.2
     TURN_RATE = 15
@@ -63,27 +68,49 @@ class Car:
     GOAL_REWARD = 100
     END_GOAL_REWARD = 1000
 
-    def __init__(self, track: Track, brain=None):
+    def __init__(self, track: Track, brain=None, start_pose=None, action_repeat=1, phase=0, keep_history=True):
         # Track and brain
         self.track = track
         self.brain = brain if brain else NeuralNetwork(input_size=10, hidden_size=10, output_size=2)
 
-        # Initial position and velocity
-        self.position = pygame.Vector2(track.points[0]) if track.points else pygame.Vector2(100.0, 100.0)
+        # Decision schedule: think every `action_repeat` ticks, offset by `phase`
+        self.action_repeat = action_repeat
+        self.phase = phase
+
+        # Start pose (shared across a population, so it is computed once per track)
+        start_position, self.start_angle = start_pose if start_pose else track.get_start_pose()
+        self.start_position = pygame.Vector2(start_position)
+
+        # Position/velocity vectors and the history buffer (x, y, acceleration per tick) are
+        # reused across generations; update() and reset() modify them in place. The buffer
+        # only grows to the longest trail recorded, and only cars that keep a trail write it.
+        self.position = pygame.Vector2(self.start_position)
         self.velocity = pygame.Vector2(0, 0)
+        self.keep_history = keep_history
+        self.history = array("f")
+        self.reset()
+
+    def reset(self, brain=None):
+        """Return the car to the start pose, optionally swapping in a new brain."""
+        if brain is not None:
+            self.brain = brain
+
+        # Position, velocity and facing angle
+        self.position.update(self.start_position)
+        self.velocity.update(0, 0)
         self.acceleration = 0
-
-        # Initial facing angle (aligned with first segment if possible)
-        if len(track.points) >= 2:
-            first_vec = pygame.Vector2(track.points[1]) - pygame.Vector2(track.points[0])
-            self.angle = math.degrees(math.atan2(first_vec.y, first_vec.x))
-        else:
-            self.angle = 0.0
+        self.angle = self.start_angle
 
         # State, score, and history
         self.state = CarState.ON_ROAD
-        self.history = []
+        self.history_count = 0
         self.score = 0.0
+        self.progress = 0.0
+
+        # Held decision (outputs and per-tick progress reward)
+        self.ticks = 0
+        self.output = None
+        self.reward = 0.0
 
     # ========================================================
     #   Actions
@@ -104,29 +131,28 @@ class Car:
     def update(self):
         """Update car movement, collisions, sensors, and history."""
         if self.state == CarState.CRASHED:
-            self.velocity = pygame.Vector2(0, 0)
+            self.velocity.update(0, 0)
             self.acceleration = 0
             self.score += self.CRASH_PENALTY
             return
         elif self.state == CarState.GOAL:
-            self.velocity = pygame.Vector2(0, 0)
+            self.velocity.update(0, 0)
             self.acceleration = 0
             self.score += self.GOAL_REWARD
             return
 
-        # Forward direction vector
-        forward = pygame.Vector2(math.cos(math.radians(self.angle)), math.sin(math.radians(self.angle)))
+        # Forward direction (unit vector)
+        rad = math.radians(self.angle)
+        forward_x, forward_y = math.cos(rad), math.sin(rad)
 
         # Apply acceleration
-        self.velocity += forward * self.acceleration
+        vx = self.velocity.x + forward_x * self.acceleration
+        vy = self.velocity.y + forward_y * self.acceleration
 
         # Decompose velocity into forward and lateral components
-        if self.velocity.length() > 0:
-            v_forward = forward.normalize() * self.velocity.dot(forward)
-            v_lateral = self.velocity - v_forward
-        else:
-            v_forward = pygame.Vector2(0, 0)
-            v_lateral = pygame.Vector2(0, 0)
+        along = vx * forward_x + vy * forward_y
+        forward_vx, forward_vy = forward_x * along, forward_y * along
+        lateral_vx, lateral_vy = vx - forward_vx, vy - forward_vy
 
         # Determine current surface type
         color = self.track.surface.get_at((int(self.position.x), int(self.position.y)))[:3]
@@ -144,9 +170,10 @@ class Car:
             self.score += self.GRASS_PENALTY
 
         # Apply resistances
-        v_forward *= (1 - forward_resistance)
-        v_lateral *= (1 - lateral_static) if v_lateral.length() <= MAX_STATIC_LATERAL else (1 - lateral_kinetic)
-        self.velocity = v_forward + v_lateral
+        forward_factor = 1 - forward_resistance
+        lateral_factor = (1 - lateral_static) if math.hypot(lateral_vx, lateral_vy) <= MAX_STATIC_LATERAL else (1 - lateral_kinetic)
+        self.velocity.update(forward_vx * forward_factor + lateral_vx * lateral_factor,
+                             forward_vy * forward_factor + lateral_vy * lateral_factor)
 
         # Cap velocity
         if self.velocity.length() > self.MAX_VELOCITY:
@@ -155,10 +182,10 @@ class Car:
         # Update position
         self.position += self.velocity
         self.check_collision()
-        self.check_sensors(arc=360, resolution=8, max_distance=10000)
 
         # Record history
-        self.history.append(CarHistoryNode(self.track.surface, self.position, self.acceleration))
+        if self.keep_history:
+            self.record_history()
 
         self.acceleration = 0
 
@@ -177,7 +204,7 @@ class Car:
                 collided = True
                 break
         if collided:
-            self.velocity = pygame.Vector2(0, 0)
+            self.velocity.update(0, 0)
             self.state = CarState.CRASHED
             self.score += self.CRASH_PENALTY
 
@@ -196,25 +223,46 @@ class Car:
             readings.append(distance)
         return readings
 
+    def sensor_endpoints(self, arc=180, resolution=8, max_distance=150):
+        """Cast sensor rays and return the (x, y) point where each one hits a wall."""
+        endpoints = []
+        for i, distance in enumerate(self.check_sensors(arc, resolution, max_distance)):
+            ray_angle = math.radians(self.angle + (i * arc / resolution) - arc / 2)
+            endpoints.append((self.position.x + math.cos(ray_angle) * distance,
+                              self.position.y + math.sin(ray_angle) * distance))
+        return endpoints
+
     # ========================================================
     #   Intelligence
     # ========================================================
     def think(self):
-        """Evaluate sensors and velocity, then act using neural network outputs."""
-        traveled = (self.track.get_length() - self.track.get_length_remaining(self.position.x, self.position.y)) / self.track.get_length()
-        self.score += (traveled * Car.DISTANCE_SPEED_REWARD) if traveled > 0.2 else ((1 - traveled) * Car.CRASH_PENALTY)
-
-        inputs = (
-            self.check_sensors()
-            + [self.velocity.length() / self.MAX_VELOCITY,
-               self.angle / 360,
-               self.state.value / 4,
-               traveled / self.track.get_length()]
-        )
-        output = self.brain.forward(inputs)
+        """Evaluate sensors and velocity, then act using neural network outputs.
+
+        Every car decides on its first tick; after that, sensing and deciding only
+        happen every `action_repeat` ticks (offset by `phase`), and the last outputs
+        and progress reward are held in between.
+        """
+        decide = self.ticks == 0 or (self.ticks + self.phase) % self.action_repeat == 0
+        self.ticks += 1
+
+        if decide:
+            traveled = (self.track.get_length() - self.track.get_length_remaining(self.position.x, self.position.y)) / self.track.get_length()
+            self.progress = traveled
+            self.reward = (traveled * Car.DISTANCE_SPEED_REWARD) if traveled > 0.2 else ((1 - traveled) * Car.CRASH_PENALTY)
+
+            inputs = (
+                self.check_sensors()
+                + [self.velocity.length() / self.MAX_VELOCITY,
+                   self.angle / 360,
+                   self.state.value / 4,
+                   traveled / self.track.get_length()]
+            )
+            self.output = self.brain.forward(inputs)
+
+        self.score += self.reward
         if (self.state != CarState.CRASHED) and (self.state != CarState.GOAL):
-            self.accelerate(output[0])
-            self.turn(output[1])
+            self.accelerate(self.output[0])
+            self.turn(self.output[1])
 
     def finalize_fitness(self):
         """Add final reward if goal is reached."""
@@ -222,60 +270,61 @@ class Car:
         if self.state == CarState.GOAL:
             self.score += self.END_GOAL_REWARD
 
+    def record_history(self):
+        """Add the current position and acceleration to the trail, reusing buffer space from earlier generations."""
+        i = self.history_count * 3
+        if i < len(self.history):
+            self.history[i] = self.position.x
+            self.history[i + 1] = self.position.y
+            self.history[i + 2] = self.acceleration
+        else:
+            self.history.append(self.position.x)
+            self.history.append(self.position.y)
+            self.history.append(self.acceleration)
+        self.history_count += 1
+
     # ========================================================
     #   Rendering
     # ========================================================
-    def draw(self, history=True, sensors=False):
-        """Draw car body with dynamic color, history, and sensors (if enabled)."""
-        
-        
+    @staticmethod
+    def draw_body(surface, position, angle, speed, progress, state):
+        """Draw a car triangle colored by speed (red/green), progress (blue) and state."""
         # Normalize velocity into [0, 1]
-        norm = max(0, min(1, self.velocity.length() / Car.MAX_VELOCITY))
+        norm = max(0, min(1, speed / Car.MAX_VELOCITY))
 
         # Compute color channels
-        traveled = self.track.get_length() - self.track.get_length_remaining(self.position.x, self.position.y)
-        blue = int(255 * (traveled / (self.track.get_length())))
-        if self.velocity.length() < Car.MAX_VELOCITY * 0.5:
+        blue = int(255 * progress)
+        if speed < Car.MAX_VELOCITY * 0.5:
             red = 127
             green = int(255 * norm)
         else:
             red = int(255 * (1 - norm))
             green = 127
 
-        if self.state == CarState.CRASHED:
+        if state == CarState.CRASHED:
             color = (20, 20, 40)  # Gray for crashed
         else:
             color = (red, green, blue)
 
         # Car triangle (tip, rear-left, rear-right)
         length, width = 12, 8
-        forward = pygame.Vector2(math.cos(math.radians(self.angle)), math.sin(math.radians(self.angle)))
+        position = pygame.Vector2(position)
+        forward = pygame.Vector2(math.cos(math.radians(angle)), math.sin(math.radians(angle)))
         right = pygame.Vector2(-forward.y, forward.x)
-        tip = self.position + forward * length / 2
-        rear_left = self.position - forward * length / 2 + right * width / 2
-        rear_right = self.position - forward * length / 2 - right * width / 2
-
-        pygame.draw.polygon(self.track.surface, color, [tip, rear_left, rear_right])
-
-        if history:
-            self.draw_history()
-        if sensors:
-            self.draw_sensors()
-
-    def draw_sensors(self, arc=180, resolution=8, max_distance=150, color=(0, 255, 0)):
-        """Draw visible sensor rays."""
-        for i in range(resolution):
-            ray_angle = math.radians(self.angle + (i * arc / resolution) - arc / 2)
-            dir_vector = pygame.Vector2(math.cos(ray_angle), math.sin(ray_angle))
-            distance = 0
-            while distance < max_distance:
-                test_pos = self.position + dir_vector * distance
-                if self.track.surface.get_at((int(test_pos.x), int(test_pos.y)))[:3] == Track.WALL_COLOR:
-                    break
-                distance += 1
-            pygame.draw.line(self.track.surface, color, self.position, self.position + dir_vector * distance, 1)
-
-    def draw_history(self):
-        """Draw all history nodes."""
-        for node in self.history:
-            node.draw()
+        tip = position + forward * length / 2
+        rear_left = position - forward * length / 2 + right * width / 2
+        rear_right = position - forward * length / 2 - right * width / 2
+
+        pygame.draw.polygon(surface, color, [tip, rear_left, rear_right])
+
+    @staticmethod
+    def draw_trail(surface, history):
+        """Draw a recorded trail given as a flat (x, y, acceleration, ...) sequence."""
+        for i in range(0, len(history) - 2, 3):
+            CarHistoryNode.draw(surface, history[i], history[i + 1], history[i + 2])
+
+    @staticmethod
+    def draw_sensor_rays(surface, origin, endpoints, color=(0, 255, 0)):
+        """Draw sensor rays from the car position to each wall hit."""
+        for endpoint in endpoints:
+            pygame.draw.line(surface, color, origin, endpoint, 1)
@@ -1,16 +1,41 @@
+from array import array
+import math
 from car import Car, CarState
+from track import Track
 import random
 
 
 class Population:
-    def __init__(self, track, size=100):
+    def __init__(self, track, size=100, action_repeat=1, keep_history=True):
+        if action_repeat < 1:
+            raise ValueError(f"action_repeat must be at least 1, got {action_repeat}")
+
         # --- Population state ---
         self.track = track
+        self.tracks = [track]
         self.size = size
-        self.cars = [Car(track) for _ in range(size)]
+        self.action_repeat = action_repeat
+        self.start_pose = track.get_start_pose()
+
+        # Cars are staggered across decision phases so each tick does ~size/action_repeat thinks
+        self.cars = [Car(track, start_pose=self.start_pose, action_repeat=action_repeat, phase=i % action_repeat,
+                         keep_history=keep_history)
+                     for i in range(size)]
         self.generation = 0
         self.pcts = []
 
+    # ================= Simulation =================
+    def update(self):
+        """Advance every car by one tick (sense, decide, then move)."""
+        for car in self.cars:
+            car.think()
+            car.update()
+
+    def set_keep_history(self, enabled):
+        """Turn trail recording on or off for the cars whose trail can be drawn."""
+        for car in self.cars:
+            car.keep_history = enabled
+
     # ================= Fitness =================
     def evaluate_fitness(self):
         """Calculate fitness for each car."""
@@ -35,7 +60,7 @@ class Population:
         total_score = sum(c.score for c in top) + 1e-6
         self.pcts = []
 
-        next_gen = []
+        next_brains = []
         for car in top:
             # Proportional offspring count
             n_offspring = int((car.score / total_score) * self.size)
@@ -45,20 +70,290 @@ class Population:
             for _ in range(n_offspring):
                 child_brain = car.brain.clone()
                 child_brain.mutate(rate=0.1)
-                next_gen.append(Car(self.track, brain=child_brain))
+                next_brains.append(child_brain)
 
         # Fill to population size if needed
-        while len(next_gen) < self.size:
+        while len(next_brains) < self.size:
             parent = random.choice(self.cars[max(2, int(len(self.cars) * ELITE_PERCENTAGE)):])
             child_brain = parent.brain.clone()
             child_brain.mutate(rate=0.1)
-            next_gen.append(Car(self.track, brain=child_brain))
+            next_brains.append(child_brain)
 
-        # Replace population
-        self.cars = next_gen
+        # Re-arm the existing cars with the new genomes
+        self.rearm(next_brains[:self.size])
         self.generation += 1
 
+    def rearm(self, brains):
+        """Reset every car in the pool in place, handing each one a new brain."""
+        for car, brain in zip(self.cars, brains):
+            car.reset(brain)
+
     # ================= Status =================
     def all_done(self):
         """Check if all cars have crashed."""
         return all(car.state == CarState.CRASHED for car in self.cars)
+
+
+class MultiTrackPopulation(Population):
+    """Population scored on several tracks at once, in one batched pass per tick.
+
+    Per-(track, car) state lives in flat arrays indexed `t * size + c`. Each tick, every
+    deciding genome runs its forward pass once over its stacked per-track inputs, and
+    surface, collision and sensor lookups read the tracks' stacked terrain and clearance
+    rasters (see Track.build_terrain) instead of the surfaces. The physics and scoring
+    mirror Car step for step, so every entry scores exactly as a Car on its track would.
+    Row 0 (the displayed track) is copied into `self.cars` after every tick, so the cars
+    render, record trails and breed like a single-track Population.
+    """
+
+    AGGREGATES = {
+        "mean": lambda scores: sum(scores) / len(scores),
+        "worst": min,
+    }
+
+    # Sensor ray offsets from the heading and collision probe directions (as in Car)
+    SENSOR_OFFSETS = [i * 180 / 8 for i in range(8)]
+    COLLISION_PROBES = [(math.cos(math.radians(angle)), math.sin(math.radians(angle))) for angle in range(0, 360, 45)]
+
+    def __init__(self, tracks, size=100, aggregate="mean", action_repeat=1, keep_history=True):
+        # self.cars breeds and renders the displayed track (tracks[0])
+        super().__init__(tracks[0], size, action_repeat, keep_history)
+        self.tracks = tracks
+        self.aggregate = MultiTrackPopulation.AGGREGATES[aggregate]
+
+        self.width, self.height = tracks[0].surface.get_size()
+        if any(track.surface.get_size() != (self.width, self.height) for track in tracks):
+            raise ValueError("all tracks must share one surface size")
+
+        # --- Stacked per-track lookups (track t starts at t * its raster size) ---
+        for track in tracks:
+            if track.terrain is None:
+                track.build_terrain()
+            if track.progress_map is None:
+                track.build_progress_map()
+        self.terrain = b"".join(track.terrain for track in tracks)
+        self.clearance = b"".join(track.clearance for track in tracks)
+        self.blocks_x = tracks[0].blocks_x
+        self.remaining = array("d")
+        self.remaining_offsets = []
+        for track in tracks:
+            self.remaining_offsets.append(len(self.remaining))
+            self.remaining.extend(track.remaining_table)
+        self.lengths = [track.get_length() for track in tracks]
+        self.start_poses = [track.get_start_pose() for track in tracks]
+
+        # Ray step per clearance value; a pixel of slack keeps truncation and rounding safe
+        self.ray_steps = bytes(max(1, r - 2) for r in range(256))
+
+        # --- Per-(track, car) state ---
+        entries = len(tracks) * size
+        self.x = array("d", bytes(8 * entries))
+        self.y = array("d", bytes(8 * entries))
+        self.vx = array("d", bytes(8 * entries))
+        self.vy = array("d", bytes(8 * entries))
+        self.angle = array("d", bytes(8 * entries))
+        self.score = array("d", bytes(8 * entries))
+        self.progress = array("d", bytes(8 * entries))
+        self.reward = array("d", bytes(8 * entries))
+        self.acceleration_output = array("d", bytes(8 * entries))  # Held network outputs
+        self.turn_output = array("d", bytes(8 * entries))
+        self.states = bytearray(entries)                             # CarState values
+        self.ticks = 0
+        self.rearm([car.brain for car in self.cars])
+
+    # ================= Simulation =================
+    def update(self):
+        """Advance every car on every track by one batched tick (decide, then move)."""
+        if self.ticks == 0:
+            deciding = range(self.size)
+        else:
+            deciding = self.phase_columns[-self.ticks % self.action_repeat]
+        self.ticks += 1
+
+        for c in deciding:
+            self.decide(c)
+        self.move()
+
+        # Mirror the displayed track into the Car objects
+        for c, car in enumerate(self.cars):
+            car.position.update(self.x[c], self.y[c])
+            car.velocity.update(self.vx[c], self.vy[c])
+            car.angle = self.angle[c]
+            car.state = CarState(self.states[c])
+            car.score = self.score[c]
+            car.progress = self.progress[c]
+
+    def decide(self, c):
+        """Update column c's progress rewards and run its genome once over every live track's inputs."""
+        CRASHED, GOAL = CarState.CRASHED.value, CarState.GOAL.value
+        size = self.size
+        inputs = []
+        live = []
+        for t, track in enumerate(self.tracks):
+            e = t * size + c
+            x, y = self.x[e], self.y[e]
+            length = self.lengths[t]
+            remaining = self.remaining[self.remaining_offsets[t] + track.closest_point_index(x, y)]
+            traveled = (length - remaining) / length
+            self.progress[e] = traveled
+            self.reward[e] = (traveled * Car.DISTANCE_SPEED_REWARD) if traveled > 0.2 else ((1 - traveled) * Car.CRASH_PENALTY)
+
+            # Crashed and finished cars never act again, so they skip sensing and the network
+            state = self.states[e]
+            if state == CRASHED or state == GOAL:
+                continue
+            vx, vy = self.vx[e], self.vy[e]
+            inputs.append(self.sense(t, x, y, self.angle[e])
+                          + [math.sqrt(vx * vx + vy * vy) / Car.MAX_VELOCITY,
+                             self.angle[e] / 360,
+                             state / 4,
+                             traveled / length])
+            live.append(e)
+
+        for e, (acceleration, turn) in zip(live, self.brains[c].forward_batch(inputs)):
+            self.acceleration_output[e] = acceleration
+            self.turn_output[e] = turn
+
+    def sense(self, t, x, y, angle, max_distance=150):
+        """Sensor readings for a car on track t, identical to Car.check_sensors.
+
+        Rays march in 1 px samples like Car's, but skip ahead by the clearance raster's
+        guaranteed wall-free distance, so they only sample pixels that could be walls.
+        """
+        terrain, clearance, ray_steps = self.terrain, self.clearance, self.ray_steps
+        width, height, blocks_x, block = self.width, self.height, self.blocks_x, Track.CLEARANCE_BLOCK
+        terrain_base = t * width * height
+        clearance_base = t * len(self.tracks[t].clearance)
+        WALL = Track.TERRAIN_WALL
+
+        readings = []
+        for offset in MultiTrackPopulation.SENSOR_OFFSETS:
+            ray_angle = math.radians(angle + offset - 90.0)
+            dx, dy = math.cos(ray_angle), math.sin(ray_angle)
+            distance = 0
+            while distance < max_distance:
+                px, py = int(x + dx * distance), int(y + dy * distance)
+                if not (0 <= px < width and 0 <= py < height):
+                    break
+                if terrain[terrain_base + py * width + px] == WALL:
+                    break
+                distance += ray_steps[clearance[clearance_base + (py // block) * blocks_x + px // block]]
+            readings.append(min(distance, max_distance))
+        return readings
+
+    def move(self):
+        """Apply the held outputs and step the physics of every entry (Car.think's actions, then Car.update)."""
+        CRASHED, GRASS, ROAD, GOAL = (CarState.CRASHED.value, CarState.ON_GRASS.value,
+                                      CarState.ON_ROAD.value, CarState.GOAL.value)
+        TERRAIN_ROAD, TERRAIN_GOAL, WALL = Track.TERRAIN_ROAD, Track.TERRAIN_GOAL, Track.TERRAIN_WALL
+        MAX_STATIC_LATERAL = 0.2
+        terrain, width, height = self.terrain, self.width, self.height
+        xs, ys, vxs, vys, angles, scores, states = self.x, self.y, self.vx, self.vy, self.angle, self.score, self.states
+
+        for e in range(len(states)):
+            scores[e] += self.reward[e]
+            state = states[e]
+            if state == CRASHED:
+                scores[e] += Car.CRASH_PENALTY
+                continue
+            elif state == GOAL:
+                scores[e] += Car.GOAL_REWARD
+                continue
+
+            # Held actions (Car.accelerate and Car.turn)
+            x, y, vx, vy = xs[e], ys[e], vxs[e], vys[e]
+            acceleration = max(-1, min(1, self.acceleration_output[e])) * Car.ACCELERATION_RATE
+            speed_factor = 1 - min(math.sqrt(vx * vx + vy * vy) / Car.MAX_VELOCITY, 1)
+            angle = angles[e] + max(-1, min(1, self.turn_output[e])) * Car.TURN_RATE * speed_factor
+            angles[e] = angle
+
+            # Forward direction, then velocity split into forward and lateral components
+            rad = math.radians(angle)
+            forward_x, forward_y = math.cos(rad), math.sin(rad)
+            vx = vx + forward_x * acceleration
+            vy = vy + forward_y * acceleration
+            along = vx * forward_x + vy * forward_y
+            forward_vx, forward_vy = forward_x * along, forward_y * along
+            lateral_vx, lateral_vy = vx - forward_vx, vy - forward_vy
+
+            # Surface type under the car
+            base = (e // self.size) * width * height
+            px, py = int(x), int(y)
+            surface = terrain[base + py * width + px] if 0 <= px < width and 0 <= py < height else None
+            if surface == TERRAIN_ROAD:
+                forward_resistance, lateral_static, lateral_kinetic = 0, 0.8, 0.4
+                state = ROAD
+            elif surface == TERRAIN_GOAL:
+                forward_resistance, lateral_static, lateral_kinetic = 0, 0.8, 0.4
+                state = GOAL
+            else:
+                forward_resistance, lateral_static, lateral_kinetic = 0.1, 0.3, 0.2
+                state = GRASS
+                scores[e] += Car.GRASS_PENALTY
+
+            # Resistances, speed cap and movement
+            forward_factor = 1 - forward_resistance
+            lateral_factor = (1 - lateral_static) if math.hypot(lateral_vx, lateral_vy) <= MAX_STATIC_LATERAL else (1 - lateral_kinetic)
+            vx = forward_vx * forward_factor + lateral_vx * lateral_factor
+            vy = forward_vy * forward_factor + lateral_vy * lateral_factor
+            speed = math.sqrt(vx * vx + vy * vy)
+            if speed > Car.MAX_VELOCITY:
+                fraction = Car.MAX_VELOCITY / speed
+                vx, vy = vx * fraction, vy * fraction
+            x, y = x + vx, y + vy
+
+            # Collision probes (anything off the surface counts as wall)
+            for probe_x, probe_y in MultiTrackPopulation.COLLISION_PROBES:
+                px, py = int(x + probe_x * 5), int(y + probe_y * 5)
+                if not (0 <= px < width and 0 <= py < height) or terrain[base + py * width + px] == WALL:
+                    vx = vy = 0.0
+                    state = CRASHED
+                    scores[e] += Car.CRASH_PENALTY
+                    break
+
+            xs[e], ys[e], vxs[e], vys[e], states[e] = x, y, vx, vy, state
+
+            # Trail of the displayed track's cars
+            if e < self.size:
+                car = self.cars[e]
+                if car.keep_history:
+                    car.position.update(x, y)
+                    car.acceleration = acceleration
+                    car.record_history()
+                    car.acceleration = 0
+
+    # ================= Fitness =================
+    def evaluate_fitness(self):
+        """Finalize every entry, then fold each genome's per-track scores into its car in self.cars."""
+        GOAL = CarState.GOAL.value
+        for e, state in enumerate(self.states):
+            if state == GOAL:
+                self.score[e] += Car.END_GOAL_REWARD
+
+        size = self.size
+        for c, car in enumerate(self.cars):
+            car.score = self.aggregate([self.score[t * size + c] for t in range(len(self.tracks))])
+
+    # ================= Selection & Breeding =================
+    def rearm(self, brains):
+        """Reset every entry to its track's start so column c drives genome c everywhere."""
+        super().rearm(brains)
+        self.brains = [car.brain for car in self.cars]
+        self.phase_columns = [[c for c, car in enumerate(self.cars) if car.phase == phase]
+                              for phase in range(self.action_repeat)]
+
+        ROAD = CarState.ON_ROAD.value
+        for t, ((start_x, start_y), start_angle) in enumerate(self.start_poses):
+            for e in range(t * self.size, (t + 1) * self.size):
+                self.x[e], self.y[e] = start_x, start_y
+                self.vx[e] = self.vy[e] = 0.0
+                self.angle[e] = start_angle
+                self.score[e] = self.progress[e] = self.reward[e] = 0.0
+                self.acceleration_output[e] = self.turn_output[e] = 0.0
+                self.states[e] = ROAD
+        self.ticks = 0
+
+    # ================= Status =================
+    def all_done(self):
+        """Check if all cars on all tracks have crashed."""
+        return self.states.count(CarState.CRASHED.value) == len(self.states)
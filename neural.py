@@ -1,5 +1,6 @@
 import random
 import math
+from operator import mul
 
 
 class NeuralNetwork:
@@ -30,6 +31,18 @@ class NeuralNetwork:
 
         return outputs
 
+    def forward_batch(self, batch):
+        """Compute outputs for a list of input vectors (same results as forward on each one)."""
+        # Weight columns feeding each hidden/output unit, gathered once for the whole batch
+        hidden_columns = list(zip(*self.w1))
+        output_columns = list(zip(*self.w2))
+
+        results = []
+        for inputs in batch:
+            hidden = [math.tanh(sum(map(mul, inputs, column))) for column in hidden_columns]
+            results.append([math.tanh(sum(map(mul, hidden, column))) for column in output_columns])
+        return results
+
     # ================= Utilities =================
     def clone(self):
         """Create a deep copy of the network."""
@@ -0,0 +1,339 @@
+from array import array
+from enum import Enum
+import multiprocessing
+import pickle
+import queue
+import threading
+import traceback
+import pygame
+from track import Track
+from car import Car, CarState
+from environment import Population, MultiTrackPopulation
+
+
+# ============================================================
+#   Control Commands (render -> simulation)
+# ============================================================
+class Command(Enum):
+    CLEAR_TRACK = 0         # payload: None
+    SET_TRACK = 1           # payload: list of smoothed track points
+    SET_HISTORY = 2         # payload: bool
+    SET_SENSORS = 3         # payload: bool
+    SET_EXTRA_TRACKS = 4    # payload: list of saved point lists (empty = single-track mode)
+    QUIT = 5                # payload: None
+
+
+# ============================================================
+#   Snapshot (simulation -> render)
+# ============================================================
+class Snapshot:
+    """Compact copy of everything the renderer needs to draw one frame."""
+    __slots__ = (
+        "active", "generation", "elapsed", "track_count",
+        "positions", "angles", "speeds", "progress", "states",
+        "history", "sensors", "pcts",
+        "all_time_best", "prev_gen_best", "current_gen_best",
+    )
+
+    def __init__(self):
+        self.active = False
+        self.generation = 1
+        self.elapsed = 0.0
+        self.track_count = 1
+
+        # Per-car columns, ordered by descending score (index 0 = leader)
+        self.positions = array("f")     # x0, y0, x1, y1, ...
+        self.angles = array("f")
+        self.speeds = array("f")
+        self.progress = array("f")
+        self.states = []
+
+        # Leader details and breeding stats
+        self.history = array("f")       # x, y, acceleration per recorded tick
+        self.sensors = []               # (x, y) ray endpoints
+        self.pcts = []
+
+        # Fastest times
+        self.all_time_best = None
+        self.prev_gen_best = None
+        self.current_gen_best = -1
+
+    def draw(self, surface):
+        """Draw every car (leader first, with its trail and sensor rays)."""
+        for i in range(len(self.angles)):
+            position = (self.positions[2 * i], self.positions[2 * i + 1])
+            Car.draw_body(surface, position, self.angles[i], self.speeds[i], self.progress[i], self.states[i])
+            if i == 0:
+                Car.draw_trail(surface, self.history)
+                Car.draw_sensor_rays(surface, position, self.sensors)
+
+
+# ============================================================
+#   Simulation
+# ============================================================
+class Simulation:
+    TICK_RATE = 60          # simulated ticks per second of race time
+    IDLE_TIMEOUT = 0.1      # seconds to wait for commands while there is no track
+
+    def __init__(self, size, population_size=40, generation_time=30, aggregate="mean", action_repeat=1):
+        # --- Track rasters owned by the simulation (independent of the window) ---
+        self.size = size
+        self.track = Track(pygame.Surface(size))
+        self.extra_tracks = []          # Saved tracks also scored in multi-track mode
+        self.aggregate = aggregate      # How per-track scores are combined ("mean" or "worst")
+        self.population_size = population_size
+        self.action_repeat = action_repeat      # Cars decide every `action_repeat` ticks
+        self.generation_time = generation_time
+        self.population = None
+        self.running = True
+
+        # --- Generation timing ---
+        self.ticks = 0
+
+        # --- Fastest time tracking ---
+        self.all_time_best = None       # Best time across all generations
+        self.prev_gen_best = None       # Best time in previous generation
+        self.current_gen_best = -1      # Best time in current generation (-1 = none yet)
+
+        # --- Render options ---
+        self.show_history = True
+        self.show_sensors = False
+
+    # ================= Commands =================
+    def process_commands(self, commands, block=False):
+        """Apply all pending commands from `commands` (waiting briefly for one if `block`)."""
+        while True:
+            try:
+                command, payload = commands.get(block=block, timeout=self.IDLE_TIMEOUT if block else None)
+            except queue.Empty:
+                return
+            self.handle(command, payload)
+            block = False
+
+    def handle(self, command, payload):
+        """Apply a single control command."""
+        if command == Command.CLEAR_TRACK:
+            self.track.clear()
+            self.population = None
+        elif command == Command.SET_TRACK:
+            self.set_track(payload)
+        elif command == Command.SET_HISTORY:
+            self.show_history = payload
+            if self.population:
+                self.population.set_keep_history(payload)
+        elif command == Command.SET_SENSORS:
+            self.show_sensors = payload
+        elif command == Command.SET_EXTRA_TRACKS:
+            self.set_extra_tracks(payload)
+        elif command == Command.QUIT:
+            self.running = False
+
+    def set_track(self, points):
+        """Rebuild the track raster and start a fresh population on it (tracks under 2 points are rejected)."""
+        self.track.points = list(points)
+        self.track.draw()
+        self.track.build_progress_map()
+        if len(self.track.points) < 2 or self.track.get_length() <= 0:
+            self.population = None
+        else:
+            self.population = self.build_population()
+        self.ticks = 0
+        self.all_time_best = None
+        self.prev_gen_best = None
+        self.current_gen_best = -1
+
+    def set_extra_tracks(self, point_lists):
+        """Rasterize the saved tracks to score on, carrying the current genomes over."""
+        self.extra_tracks = []
+        for points in point_lists:
+            track = Track(pygame.Surface(self.size))
+            track.points = list(points)
+            track.draw()
+            track.build_progress_map()
+            self.extra_tracks.append(track)
+
+        # Re-arm a population on the new track set with the trained brains
+        if self.population:
+            previous = self.population
+            self.population = self.build_population()
+            self.population.rearm([car.brain for car in previous.cars])
+            self.population.generation = previous.generation
+            self.population.pcts = previous.pcts
+            self.ticks = 0
+            self.current_gen_best = -1
+
+    def build_population(self):
+        """Create a population on the drawn track plus every saved track that differs from it."""
+        extra_tracks = [track for track in self.extra_tracks if track.points != self.track.points]
+        if extra_tracks:
+            tracks = [self.track] + extra_tracks
+            return MultiTrackPopulation(tracks, self.population_size, self.aggregate, self.action_repeat,
+                                        self.show_history)
+        return Population(self.track, self.population_size, self.action_repeat, self.show_history)
+
+    # ================= Simulation Update =================
+    def tick(self):
+        """Advance the population by one tick and roll over the generation when it ends."""
+        self.ticks += 1
+        elapsed = self.ticks / self.TICK_RATE
+        self.population.update()
+
+        # --- Update current generation fastest time ---
+        for car in self.population.cars:
+            if car.state == CarState.GOAL:
+                car_time = round(elapsed, 2)  # hundredths of a second
+                if self.current_gen_best == -1 or car_time < self.current_gen_best:
+                    self.current_gen_best = car_time
+
+        # --- Reset generation if time is up or all cars crashed ---
+        if elapsed >= self.generation_time or self.population.all_done():
+            self.next_generation()
+
+    def next_generation(self):
+        """Score and breed the population, then roll the fastest times over."""
+        self.population.evaluate_fitness()
+        self.population.select_and_breed()
+        self.ticks = 0
+
+        # --- Update fastest times ---
+        self.prev_gen_best = self.current_gen_best if self.current_gen_best != -1 else None
+        self.current_gen_best = -1
+        if self.prev_gen_best is not None:
+            if self.all_time_best is None or self.prev_gen_best < self.all_time_best:
+                self.all_time_best = self.prev_gen_best
+
+    # ================= Snapshots =================
+    def capture(self, snapshot):
+        """Fill `snapshot` in place with the current simulation state."""
+        snapshot.active = self.population is not None
+        snapshot.elapsed = self.ticks / self.TICK_RATE
+        snapshot.all_time_best = self.all_time_best
+        snapshot.prev_gen_best = self.prev_gen_best
+        snapshot.current_gen_best = self.current_gen_best
+
+        for column in (snapshot.positions, snapshot.angles, snapshot.speeds, snapshot.progress, snapshot.history):
+            del column[:]
+        for column in (snapshot.states, snapshot.sensors, snapshot.pcts):
+            column.clear()
+        if not snapshot.active:
+            return
+
+        snapshot.generation = self.population.generation + 1
+        snapshot.track_count = len(self.population.tracks)
+        snapshot.pcts.extend(self.population.pcts)
+
+        # Sort cars by descending fitness (without reordering the population itself)
+        ranked = sorted(self.population.cars, key=lambda c: c.score, reverse=True)
+        for car in ranked:
+            snapshot.positions.append(car.position.x)
+            snapshot.positions.append(car.position.y)
+            snapshot.angles.append(car.angle)
+            snapshot.speeds.append(car.velocity.length())
+            snapshot.progress.append(car.progress)
+            snapshot.states.append(car.state)
+
+        leader = ranked[0]
+        if self.show_history:
+            snapshot.history.extend(leader.history[:leader.history_count * 3])
+        if self.show_sensors:
+            snapshot.sensors.extend(leader.sensor_endpoints())
+
+
+# ============================================================
+#   Simulation Process (render side)
+# ============================================================
+class SimulationProcess:
+    """Runs a Simulation in a worker process and hands its snapshots to the renderer.
+
+    The worker owns its own track rasters and steps as fast as it can. Each time the
+    renderer asks for a frame, the worker captures its back-buffer snapshot and sends
+    it through a pipe; the last snapshot received is the renderer's front buffer.
+    Neither side waits on the other.
+    """
+
+    def __init__(self, size, population_size=40, generation_time=30, aggregate="mean", action_repeat=1):
+        context = multiprocessing.get_context("spawn")
+        settings = (size, population_size, generation_time, aggregate, action_repeat)
+        self.commands = context.Queue()
+        self.connection, worker_connection = context.Pipe(duplex=False)
+        self.wanted = context.Event()   # Set when the renderer is ready for a new snapshot
+        self.process = context.Process(target=run_worker, args=(settings, self.commands, worker_connection, self.wanted),
+                                       daemon=True)
+        self.front = Snapshot()
+        self.error = None               # Traceback text sent by a failed worker
+
+    def start(self):
+        """Start the worker process."""
+        self.process.start()
+        self.wanted.set()
+
+    def stop(self):
+        """Ask the worker to exit, and terminate it if it does not."""
+        self.send(Command.QUIT)
+        self.process.join(timeout=1)
+        if self.process.is_alive():
+            self.process.terminate()
+
+    def send(self, command, payload=None):
+        """Queue a control command for the worker."""
+        self.commands.put((command, payload))
+
+    def receive(self):
+        """Take every message waiting in the pipe, keeping the newest snapshot."""
+        while self.connection.poll():
+            try:
+                message = pickle.loads(self.connection.recv_bytes())
+            except EOFError:  # worker exited and closed its end
+                return
+            if isinstance(message, Snapshot):
+                self.front = message
+            else:
+                self.error = message
+
+    def latest(self):
+        """Return the newest snapshot and ask the worker for the next one."""
+        self.receive()
+        self.wanted.set()
+        return self.front
+
+    def check(self):
+        """Raise in the render process if the worker failed or exited."""
+        self.receive()
+        if self.error is not None:
+            raise RuntimeError(f"simulation process stopped:\n{self.error}")
+        if not self.process.is_alive():
+            raise RuntimeError("simulation process exited unexpectedly")
+
+
+def run_worker(settings, commands, connection, wanted):
+    """Worker process entry point: step the simulation and send a snapshot whenever one is wanted."""
+    simulation = Simulation(*settings)
+    snapshot = Snapshot()  # back buffer (the renderer holds the front one)
+
+    # Pipe writes happen on a sender thread so a large snapshot never stalls the simulation
+    outbox = queue.Queue(maxsize=1)
+    sender = threading.Thread(target=send_messages, args=(outbox, connection), daemon=True)
+    sender.start()
+
+    try:
+        while simulation.running:
+            simulation.process_commands(commands, block=simulation.population is None)
+            if simulation.population:
+                simulation.tick()
+            if wanted.is_set() and outbox.empty():
+                wanted.clear()
+                simulation.capture(snapshot)
+                outbox.put(pickle.dumps(snapshot, pickle.HIGHEST_PROTOCOL))
+    except Exception:
+        outbox.put(pickle.dumps(traceback.format_exc()))
+    outbox.put(None)
+    sender.join()
+
+
+def send_messages(outbox, connection):
+    """Write pickled messages from `outbox` to the pipe until a None arrives."""
+    while True:
+        message = outbox.get()
+        if message is None:
+            return
+        connection.send_bytes(message)
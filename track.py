@@ -1,4 +1,6 @@
 from enum import Enum
+import json
+import math
 import pygame
 
 
@@ -25,6 +27,17 @@ class Track:
     GOAL_COLOR = (255, 255, 255)
     TEMP_COLOR = (255, 0, 0)
 
+    # Progress lookup
+    PROGRESS_CELL = 32  # Grid cell size (pixels) for the nearest-point search
+
+    # Terrain rasters (see build_terrain)
+    TERRAIN_OTHER = 0
+    TERRAIN_ROAD = 1
+    TERRAIN_GOAL = 2
+    TERRAIN_WALL = 3
+    CLEARANCE_BLOCK = 4  # Clearance raster resolution (pixels per block side)
+    WALL_TABLE = bytes(TERRAIN_WALL) + b"\x01" + bytes(255 - TERRAIN_WALL)  # bytes.translate: wall -> 1, else 0
+
     # ================= Initialization =================
     def __init__(self, surface: pygame.Surface):
         self.surface = surface
@@ -32,16 +45,29 @@ class Track:
         self.state = TrackState.EMPTY
         self.length = 0.0  # Total track length in pixels
 
+        # Progress lookup (see build_progress_map)
+        self.progress_map = None    # Grid cell -> indices of the track points inside it
+        self.remaining_table = []   # Remaining track length from each point index
+
+        # Terrain rasters for batched simulation (see build_terrain)
+        self.terrain = None
+        self.clearance = None
+        self.blocks_x = 0
+
     # ================= Track Editing =================
     def clear(self):
         """Reset track to empty."""
         self.points = []
         self.state = TrackState.EMPTY
+        self.progress_map = None
+        self.terrain = None
         self.surface.fill((255, 255, 255))
 
     def add_point(self, point):
         """Add a point while drawing track."""
         self.points.append(point)
+        self.progress_map = None
+        self.terrain = None
         if len(self.points) > 1:
             self.state = TrackState.DRAWING
             self.surface.fill((255, 255, 255))
@@ -50,6 +76,7 @@ class Track:
     # ================= Track Rendering =================
     def draw(self):
         """Render track layers (wall, runoff, road, goal)."""
+        self.terrain = None
         self.surface.fill(Track.GRASS_COLOR)
 
         # Walls
@@ -102,19 +129,74 @@ class Track:
         self.length = total
         return total
 
+    def get_start_pose(self):
+        """Return the start position and facing angle (aligned with first segment if possible)."""
+        position = self.points[0] if self.points else (100.0, 100.0)
+        if len(self.points) < 2:
+            return position, 0.0
+
+        dx = self.points[1][0] - self.points[0][0]
+        dy = self.points[1][1] - self.points[0][1]
+        return position, math.degrees(math.atan2(dy, dx))
+
+    def build_progress_map(self):
+        """Precompute the remaining-length table and a grid of track points for get_length_remaining."""
+        self.progress_map = None
+        if len(self.points) < 2:
+            return
+
+        # Arc-length table (same formula as the scan in get_length_remaining)
+        n = len(self.points)
+        last_segment = Track.distance(self.points[-2], self.points[-1])
+        self.remaining_table = [(n - i - 2) * Track.DESIRED_DISTANCE + last_segment for i in range(n - 1)] + [0.0]
+
+        # Point indices bucketed by grid cell
+        progress_map = {}
+        for i, (x, y) in enumerate(self.points):
+            progress_map.setdefault((int(x // Track.PROGRESS_CELL), int(y // Track.PROGRESS_CELL)), []).append(i)
+        self.progress_map = progress_map
+
+    def closest_point_index(self, x, y) -> int:
+        """Index of the track point closest to (x, y); ties go to the lowest index, like a full scan."""
+        if self.progress_map is None:
+            closest_index = 0
+            closest_dist = float('inf')
+            for i, p in enumerate(self.points):
+                d = Track.distance((x, y), p)
+                if d < closest_dist:
+                    closest_dist = d
+                    closest_index = i
+            return closest_index
+
+        # Search rings of grid cells outward until no unvisited point can be closer
+        cell = Track.PROGRESS_CELL
+        cx, cy = int(x // cell), int(y // cell)
+        closest_index = None
+        closest_dist = float('inf')
+        ring = 0
+        while True:
+            for gx in range(cx - ring, cx + ring + 1):
+                step = 1 if gx in (cx - ring, cx + ring) else 2 * ring
+                for gy in range(cy - ring, cy + ring + 1, max(step, 1)):
+                    for i in self.progress_map.get((gx, gy), ()):
+                        d = Track.distance((x, y), self.points[i])
+                        if d < closest_dist or (d == closest_dist and i < closest_index):
+                            closest_dist = d
+                            closest_index = i
+
+            # Points outside this ring are more than ring * cell away (a pixel of slack covers rounding)
+            if closest_dist <= ring * cell - 1:
+                return closest_index
+            ring += 1
+
     def get_length_remaining(self, x, y) -> float:
         """Compute remaining track distance from a point."""
         if len(self.points) < 2:
             return 0.0
 
-        # Find closest track point
-        closest_index = 0
-        closest_dist = float('inf')
-        for i, p in enumerate(self.points):
-            d = Track.distance((x, y), p)
-            if d < closest_dist:
-                closest_dist = d
-                closest_index = i
+        closest_index = self.closest_point_index(x, y)
+        if self.progress_map is not None:
+            return self.remaining_table[closest_index]
 
         if closest_index >= len(self.points) - 1:
             return 0.0
@@ -123,6 +205,72 @@ class Track:
         total += Track.distance(self.points[-2], self.points[-1])
         return total
 
+    def build_terrain(self):
+        """Precompute byte rasters of the drawn track for the batched multi-track simulation.
+
+        `terrain[y * width + x]` is the TERRAIN_* class of each pixel (exact matches on the
+        layer colors). `clearance[by * blocks_x + bx]` is a lower bound, in pixels, on the
+        Chebyshev distance from any pixel of block (bx, by) to the nearest wall pixel, where
+        blocks are CLEARANCE_BLOCK pixels square and everything off the surface counts as wall.
+        """
+        width, height = self.surface.get_size()
+
+        # Per-pixel surface class
+        classes = pygame.Surface((width, height))
+        classes.fill((Track.TERRAIN_OTHER,) * 3)
+        for color, terrain in ((Track.WALL_COLOR, Track.TERRAIN_WALL),
+                               (Track.ROAD_COLOR, Track.TERRAIN_ROAD),
+                               (Track.GOAL_COLOR, Track.TERRAIN_GOAL)):
+            mask = pygame.mask.from_threshold(self.surface, color, (1, 1, 1, 255))
+            mask.to_surface(classes, setcolor=(terrain,) * 3, unsetcolor=None)
+        self.terrain = pygame.image.tobytes(classes, "RGB")[::3]
+
+        # Blocks holding a wall pixel (partial blocks at the edges reach off the surface)
+        block = Track.CLEARANCE_BLOCK
+        blocks_x, blocks_y = -(-width // block), -(-height // block)
+        walls = self.terrain.translate(Track.WALL_TABLE)
+        blocked = bytearray()
+        for by in range(blocks_y):
+            rows = 0
+            for y in range(by * block, min((by + 1) * block, height)):
+                rows |= int.from_bytes(walls[y * width:(y + 1) * width], "little")
+            row = rows.to_bytes(width, "little") + b"\x01" * (blocks_x * block - width)
+            partial = (by + 1) * block > height
+            blocked.extend(partial or any(row[bx * block:(bx + 1) * block]) for bx in range(blocks_x))
+
+        # Chessboard distance (in blocks) to the nearest blocked block, off-grid counting as blocked
+        distance = bytearray(0 if b else 255 for b in blocked)
+        for indices, neighbors in (
+            (range(blocks_x * blocks_y), ((-1, 0), (-1, -1), (0, -1), (1, -1))),
+            (range(blocks_x * blocks_y - 1, -1, -1), ((1, 0), (1, 1), (0, 1), (-1, 1))),
+        ):
+            for i in indices:
+                if distance[i]:
+                    by, bx = divmod(i, blocks_x)
+                    best = distance[i]
+                    for dx, dy in neighbors:
+                        nx, ny = bx + dx, by + dy
+                        d = distance[ny * blocks_x + nx] + 1 if 0 <= nx < blocks_x and 0 <= ny < blocks_y else 1
+                        if d < best:
+                            best = d
+                    distance[i] = best
+
+        # A wall block d blocks away is at least (d - 1) * block + 1 pixels away from every pixel here
+        self.clearance = distance.translate(bytes(min(255, (d - 1) * block + 1) if d else 0 for d in range(256)))
+        self.blocks_x = blocks_x
+
+    # ================= Persistence =================
+    def save(self, path):
+        """Write the track points to a JSON file."""
+        with open(path, "w") as f:
+            json.dump({"points": [list(p) for p in self.points]}, f)
+
+    @staticmethod
+    def load_points(path):
+        """Read track points from a JSON file written by save()."""
+        with open(path) as f:
+            return [tuple(p) for p in json.load(f)["points"]]
+
     # ================= Static Helpers =================
     @staticmethod
     def distance(p1, p2) -> float: